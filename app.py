@@ -1,16 +1,17 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
 import io
+import csv
 import os
-import tempfile
 import zipfile
-import calendar
+import contextlib
+import time
 import locale
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from data_processor import process_data
-from pdf_generator import generate_pdf
-from utils import format_currency, to_float, calculate_period_dates
+
+# pandas, numpy, openpyxl e reportlab (tramite data_processor e pdf_generator) sono importati
+# solo quando servono, così l'avvio dell'app non paga il loro tempo di caricamento finché
+# l'utente non carica un file
 
 # Configurazione della pagina Streamlit
 st.set_page_config(
@@ -30,11 +31,16 @@ except:
     except:
         pass  # Fallback alla lingua di sistema se l'italiano non è disponibile
 
+# Nomi dei mesi in italiano, costruiti una sola volta all'avvio
+_IT_MONTHS = (
+    "Gennaio", "Febbraio", "Marzo", "Aprile", "Maggio", "Giugno",
+    "Luglio", "Agosto", "Settembre", "Ottobre", "Novembre", "Dicembre"
+)
+
 # Funzione per ottenere i nomi dei mesi in italiano
 def get_italian_month_name(month_num):
     """
     Restituisce il nome del mese in italiano dato il suo numero (1-12)
-    Se non trova corrispondenza, ritorna il nome dal modulo calendar
     
     Args:
         month_num (int): Numero del mese (1=Gennaio, 12=Dicembre)
@@ -42,21 +48,158 @@ def get_italian_month_name(month_num):
     Returns:
         str: Nome del mese in italiano
     """
-    italian_months = {
-        1: "Gennaio", 2: "Febbraio", 3: "Marzo", 4: "Aprile",
-        5: "Maggio", 6: "Giugno", 7: "Luglio", 8: "Agosto",
-        9: "Settembre", 10: "Ottobre", 11: "Novembre", 12: "Dicembre"
-    }
-    return italian_months.get(month_num, calendar.month_name[month_num])
+    return _IT_MONTHS[month_num - 1]
+
+# Giorni di ciascun mese in un anno non bisestile
+_DAYS_IN_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+def _days_in_month(year, month):
+    """
+    Restituisce il numero di giorni del mese, tenendo conto degli anni bisestili
+    
+    Args:
+        year (int): Anno
+        month (int): Numero del mese (1-12)
+        
+    Returns:
+        int: Numero di giorni del mese
+    """
+    if month == 2 and year % 4 == 0 and (year % 100 != 0 or year % 400 == 0):
+        return 29
+    return _DAYS_IN_MONTH[month - 1]
+
+def _read_xlsx(file_bytes):
+    """
+    Legge un file .xlsx in modalità sola lettura, prendendo solo i valori delle celle.
+    In questo modo openpyxl non analizza gli stili e non costruisce il grafo
+    completo delle celle, riducendo tempi di lettura e memoria sui file grandi.
+    La prima riga è usata come intestazione, come fa pd.read_excel.
+    
+    Args:
+        file_bytes (bytes): Contenuto del file .xlsx
+        
+    Returns:
+        pd.DataFrame: Dati letti dal primo foglio attivo
+    """
+    import numpy as np
+    import openpyxl
+    import pandas as pd
+    
+    workbook = openpyxl.load_workbook(io.BytesIO(file_bytes), read_only=True, data_only=True)
+    try:
+        worksheet = workbook.active
+        # Le dimensioni salvate nel file possono essere errate: le ricalcola leggendo le righe
+        worksheet.reset_dimensions()
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, ())
+        records = list(rows)
+    finally:
+        workbook.close()
+    
+    # Ignora le righe finali completamente vuote, come pd.read_excel
+    while records and all(value is None for value in records[-1]):
+        records.pop()
+    
+    # Ignora le colonne finali completamente vuote
+    width = 0
+    for row in [header] + records:
+        for i in range(len(row) - 1, width - 1, -1):
+            if row[i] is not None:
+                width = i + 1
+                break
+    
+    # Celle vuote come NaN e righe tutte della stessa lunghezza
+    records = [
+        [np.nan if value is None else value for value in row[:width]] + [np.nan] * (width - len(row))
+        for row in records
+    ]
+    
+    # Nomi di colonna come quelli generati da pandas ("Unnamed: N", duplicati con suffisso ".N")
+    columns = []
+    seen = {}
+    for i in range(width):
+        name = header[i] if i < len(header) else None
+        name = f"Unnamed: {i}" if name is None else str(name)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        seen.setdefault(name, 0)
+        columns.append(name)
+    
+    frame = pd.DataFrame.from_records(records, columns=columns)
+    
+    # Come pd.read_excel, converte in numeri le colonne di testo che contengono solo valori
+    # numerici (es. un Codice salvato come testo '00123' diventa 123)
+    for i in range(width):
+        column = frame.iloc[:, i]
+        if pd.api.types.infer_dtype(column, skipna=True) in ('string', 'mixed-integer', 'mixed'):
+            try:
+                frame.isetitem(i, pd.to_numeric(column))
+            except (ValueError, TypeError):
+                pass
+    
+    return frame
+
+@st.cache_data(show_spinner=False)
+def _read_payroll(file_bytes, name):
+    """
+    Legge il file dati paga caricato e lo restituisce come DataFrame.
+    Il risultato è memorizzato in cache sul contenuto e sul nome del file,
+    così le riesecuzioni dello script non rileggono il file ad ogni interazione.
+    
+    Args:
+        file_bytes (bytes): Contenuto del file caricato
+        name (str): Nome del file, usato per riconoscerne il formato
+        
+    Returns:
+        pd.DataFrame: Dati grezzi letti dal file
+    """
+    import pandas as pd
+    
+    if name.endswith('.xlsx'):
+        return _read_xlsx(file_bytes)
+    if name.endswith('.xls'):
+        return pd.read_excel(io.BytesIO(file_bytes))
+    
+    # Deduce il separatore da un campione iniziale, così da poter usare il parser C di pandas
+    # (molto più veloce di engine='python'); le righe troncate in fondo al campione sono scartate
+    sample = file_bytes[:4096].decode('utf-8', errors='replace')
+    if '\n' in sample:
+        sample = sample[:sample.rfind('\n')]
+    try:
+        delimiter = csv.Sniffer().sniff(sample, delimiters=';,\t|').delimiter
+    except csv.Error:
+        return pd.read_csv(io.BytesIO(file_bytes), sep=None, engine='python')
+    return pd.read_csv(io.BytesIO(file_bytes), sep=delimiter)
+
+@st.cache_data(show_spinner=False)
+def _process(payroll_data, manual_date_info):
+    """
+    Versione in cache di process_data: rielabora i dati solo quando cambiano
+    il file caricato o il periodo selezionato.
+    
+    Args:
+        payroll_data (pd.DataFrame): Dati grezzi letti dal file
+        manual_date_info (dict): Informazioni sul periodo selezionato
+        
+    Returns:
+        tuple: (processed_data, date_info) come restituito da process_data
+    """
+    from data_processor import process_data
+    
+    return process_data(payroll_data, manual_date_info)
 
 # Definizione dei colori per l'interfaccia utente
 primary_color = "#007AFF"  # Blu principale (stile Apple)
 secondary_color = "#F5F5F7"  # Grigio chiaro per sfondi secondari
 dark_grey = "#333333"  # Grigio scuro per testi
 
+# Blocchi HTML statici dell'interfaccia, costruiti una sola volta all'avvio
+# invece che ad ogni riesecuzione dello script
+
 # Personalizzazione CSS dell'interfaccia utente
 # Questo codice definisce lo stile visuale dell'app (colori, bottoni, layout)
-st.markdown(f"""
+_STATIC_CSS = f"""
     <style>
     .main .block-container {{
         max-width: 1200px;
@@ -106,21 +249,101 @@ st.markdown(f"""
         background-color: {secondary_color};
     }}
     </style>
-""", unsafe_allow_html=True)
+"""
 
 # Titolo principale dell'app
-st.markdown(f"""
+_HEADER_HTML = """
     <h1 style='text-align: center; margin-bottom: 1.5rem;'>
         Generatore Fogli Paga
     </h1>
-""", unsafe_allow_html=True)
+"""
+
+# Titolo della sezione istruzioni nella barra laterale
+_SIDEBAR_TITLE_HTML = f"""
+    <h3 style='color: {primary_color};'>Istruzioni</h3>
+    """
+
+# Box informativo sui file supportati
+_SIDEBAR_INFO_HTML = f"""
+    <div style="margin-top: 2rem; padding: 1rem; background-color: rgba(0, 122, 255, 0.05); border-radius: 5px; border-left: 3px solid {primary_color};">
+        <h3 style='color: {primary_color}; margin-top: 0;'>Informazioni sui File</h3>
+        <p style="font-size: 0.9rem;">
+            <strong>File Dati Paga:</strong> Carica il tracciato di CL scaricabile dal campo (05>07>11). Questo file contiene i dati dei dipendenti e delle aziende.
+        </p>
+    </div>
+    """
+
+# Sezione per la selezione del periodo di elaborazione
+_PERIOD_SECTION_HTML = f"""
+    <div style="padding: 1.5rem; background-color: white; border-radius: 10px; margin-bottom: 1.5rem; box-shadow: 0 1px 2px rgba(0,0,0,0.05);">
+        <h2 style="margin-top: 0; color: {primary_color};">Selezione Periodo</h2>
+    </div>
+"""
+
+# Sezione per il caricamento del file, con la descrizione del tipo di file da caricare
+_UPLOAD_SECTION_HTML = f"""
+    <div style="padding: 1.5rem; background-color: white; border-radius: 10px; margin: 1.5rem 0; box-shadow: 0 1px 2px rgba(0,0,0,0.05);">
+        <h2 style="margin-top: 0; color: {primary_color};">Caricamento File</h2>
+    </div>
+    <div style="background-color: rgba(0, 122, 255, 0.05); padding: 1rem; border-radius: 5px; margin-bottom: 0.5rem;">
+        <p style="margin: 0; font-size: 0.9rem;">File dati paga (tracciato di CL scaricabile dal campo 05>07>11)</p>
+    </div>
+"""
+
+# Sezione di generazione dei PDF
+_GENERATE_SECTION_HTML = f"""
+    <div style="padding: 1.5rem; background-color: white; border-radius: 10px; box-shadow: 0 1px 2px rgba(0,0,0,0.05);">
+        <h2 style="margin-top: 0; color: {primary_color};">Generazione PDF</h2>
+        <p>Cliccando sul pulsante qui sotto verranno generati i PDF per tutti gli operatori presenti nei dati.</p>
+    </div>
+"""
+
+# Messaggio di elaborazione riuscita
+_PROCESSED_HTML = f"""
+    <div style="padding: 0.75rem; background-color: #f0f9ff; border-left: 4px solid {primary_color}; border-radius: 4px; margin: 1rem 0;">
+        <h3 style="margin: 0; color: {primary_color};">✓ Dati elaborati con successo!</h3>
+    </div>
+"""
+
+# Card con le informazioni sul periodo: template da completare con
+# _PERIOD_INFO_TPL % (periodo, data inizio, data fine)
+_PERIOD_INFO_TPL = """
+    <div style="padding: 1.5rem; background-color: white; border-radius: 10px; box-shadow: 0 1px 2px rgba(0,0,0,0.05); margin-bottom: 1.5rem;">
+        <h3 style="margin-top: 0; color: %s;">Informazioni Periodo</h3>
+        <p><strong>Periodo:</strong> %%s</p>
+        <p><strong>Dal:</strong> %%s</p>
+        <p><strong>Al:</strong> %%s</p>
+    </div>
+""" % primary_color
+
+# Apertura della card di avanzamento (chiusa dopo la barra di progresso)
+_PROGRESS_HEADER_HTML = f"""
+    <div style="padding: 1.5rem; background-color: white; border-radius: 10px; box-shadow: 0 1px 2px rgba(0,0,0,0.05); margin-top: 1.5rem;">
+        <h3 style="margin-top: 0; color: {primary_color};">Progresso Generazione</h3>
+"""
+
+# Stato della generazione: template da completare con _STATUS_TPL % operatore
+_STATUS_TPL = """
+    <div style="padding: 0.5rem; border-radius: 5px; margin-bottom: 0.5rem; text-align: center;">
+        <p style="margin: 0;"><strong>PDF generato per</strong>: %s</p>
+    </div>
+"""
+
+# Messaggio di generazione completata
+_COMPLETED_HTML = """
+    <div style="padding: 0.75rem; background-color: #f0fff0; border-left: 4px solid #00aa00; border-radius: 4px; margin: 1rem 0; text-align: center;">
+        <h3 style="margin: 0; color: #00aa00;">✓ Generazione PDF completata!</h3>
+        <p style="margin: 0.5rem 0 0 0;">Tutti i PDF sono stati raccolti in un unico file ZIP, scaricabile con il pulsante in alto.</p>
+    </div>
+"""
+
+# Stile e titolo principale dell'app, emessi con una sola chiamata
+st.markdown(_STATIC_CSS + _HEADER_HTML, unsafe_allow_html=True)
 
 # Barra laterale con istruzioni per l'utente
 with st.sidebar:
     # Titolo della sezione istruzioni
-    st.markdown(f"""
-    <h3 style='color: {primary_color};'>Istruzioni</h3>
-    """, unsafe_allow_html=True)
+    st.markdown(_SIDEBAR_TITLE_HTML, unsafe_allow_html=True)
     
     # Elenco di passi da seguire
     st.markdown("""
@@ -130,21 +353,10 @@ with st.sidebar:
     """)
     
     # Box informativo sui file supportati
-    st.markdown(f"""
-    <div style="margin-top: 2rem; padding: 1rem; background-color: rgba(0, 122, 255, 0.05); border-radius: 5px; border-left: 3px solid {primary_color};">
-        <h3 style='color: {primary_color}; margin-top: 0;'>Informazioni sui File</h3>
-        <p style="font-size: 0.9rem;">
-            <strong>File Dati Paga:</strong> Carica il tracciato di CL scaricabile dal campo (05>07>11). Questo file contiene i dati dei dipendenti e delle aziende.
-        </p>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(_SIDEBAR_INFO_HTML, unsafe_allow_html=True)
 
 # Sezione per la selezione del periodo di elaborazione
-st.markdown(f"""
-    <div style="padding: 1.5rem; background-color: white; border-radius: 10px; margin-bottom: 1.5rem; box-shadow: 0 1px 2px rgba(0,0,0,0.05);">
-        <h2 style="margin-top: 0; color: {primary_color};">Selezione Periodo</h2>
-    </div>
-""", unsafe_allow_html=True)
+st.markdown(_PERIOD_SECTION_HTML, unsafe_allow_html=True)
 
 # Layout a due colonne per selezionare anno e mese
 col1, col2 = st.columns(2)
@@ -156,7 +368,7 @@ with col1:
 
 with col2:
     # Selettore mese: mostra i nomi dei mesi in italiano
-    italian_month_names = [get_italian_month_name(i) for i in range(1, 13)]
+    italian_month_names = _IT_MONTHS
     current_month = datetime.now().month - 1  # -1 perché gli indici partono da 0
     selected_month = st.selectbox("Mese", italian_month_names, index=current_month)
     selected_month_idx = italian_month_names.index(selected_month) + 1  # +1 perché i mesi iniziano da 1
@@ -164,21 +376,10 @@ with col2:
 # Calcola le date di inizio e fine del mese selezionato
 # Utile per generare le informazioni sui periodi nei PDF
 start_date = datetime(selected_year, selected_month_idx, 1)
-end_date = datetime(selected_year, selected_month_idx, calendar.monthrange(selected_year, selected_month_idx)[1])
+end_date = datetime(selected_year, selected_month_idx, _days_in_month(selected_year, selected_month_idx))
 
 # Sezione per il caricamento del file
-st.markdown(f"""
-    <div style="padding: 1.5rem; background-color: white; border-radius: 10px; margin: 1.5rem 0; box-shadow: 0 1px 2px rgba(0,0,0,0.05);">
-        <h2 style="margin-top: 0; color: {primary_color};">Caricamento File</h2>
-    </div>
-""", unsafe_allow_html=True)
-
-# Descrizione del tipo di file da caricare
-st.markdown(f"""
-    <div style="background-color: rgba(0, 122, 255, 0.05); padding: 1rem; border-radius: 5px; margin-bottom: 0.5rem;">
-        <p style="margin: 0; font-size: 0.9rem;">File dati paga (tracciato di CL scaricabile dal campo 05>07>11)</p>
-    </div>
-""", unsafe_allow_html=True)
+st.markdown(_UPLOAD_SECTION_HTML, unsafe_allow_html=True)
 
 # Widget per il caricamento del file (supporta Excel e CSV)
 payroll_file = st.file_uploader("Seleziona file", type=["xlsx", "xls", "csv"], key="payroll", label_visibility="collapsed")
@@ -186,132 +387,126 @@ payroll_file = st.file_uploader("Seleziona file", type=["xlsx", "xls", "csv"], k
 # Process file when uploaded
 if payroll_file:
     try:
-        # Read payroll file
-        if payroll_file.name.endswith(('.xlsx', '.xls')):
-            payroll_data = pd.read_excel(payroll_file)
-        elif payroll_file.name.endswith('.csv'):
-            payroll_data = pd.read_csv(payroll_file, sep=None, engine='python')
-        
-        # Create date_info dict based on selected period
-        manual_date_info = {
-            "period": f"{selected_month} {selected_year}",
-            "italian_month": selected_month.lower(),  # Nome mese in italiano per il nome della cartella
-            "start_date": start_date.strftime("%d/%m/%Y"),
-            "end_date": end_date.strftime("%d/%m/%Y"),
-            "min_date": start_date,
-            "max_date": end_date
-        }
+        # Reuse the results of the previous run when neither the file nor the selected period changed
+        file_bytes = payroll_file.getvalue()
+        processing_key = (payroll_file.name, hash(file_bytes), selected_year, selected_month_idx)
         
-        # Process data with selected period info
-        processed_data, date_info = process_data(payroll_data, manual_date_info)
+        if st.session_state.get('processing_key') == processing_key:
+            processed_data = st.session_state['processed_data']
+            date_info = st.session_state['date_info']
+        else:
+            # Read payroll file (cached on file contents)
+            payroll_data = _read_payroll(file_bytes, payroll_file.name)
+            
+            # Create date_info dict based on selected period
+            manual_date_info = {
+                "period": f"{selected_month} {selected_year}",
+                "italian_month": selected_month.lower(),  # Nome mese in italiano per il nome della cartella
+                "start_date": start_date.strftime("%d/%m/%Y"),
+                "end_date": end_date.strftime("%d/%m/%Y"),
+                "min_date": start_date,
+                "max_date": end_date
+            }
+            
+            # Process data with selected period info
+            processed_data, date_info = _process(payroll_data, manual_date_info)
+            
+            st.session_state['processing_key'] = processing_key
+            st.session_state['processed_data'] = processed_data
+            st.session_state['date_info'] = date_info
         
         if processed_data is not None and not processed_data.empty:
-            st.markdown(f"""
-                <div style="padding: 0.75rem; background-color: #f0f9ff; border-left: 4px solid {primary_color}; border-radius: 4px; margin: 1rem 0;">
-                    <h3 style="margin: 0; color: {primary_color};">✓ Dati elaborati con successo!</h3>
-                </div>
-            """, unsafe_allow_html=True)
+            st.markdown(_PROCESSED_HTML, unsafe_allow_html=True)
             
             # Display processing information in a card
-            st.markdown(f"""
-                <div style="padding: 1.5rem; background-color: white; border-radius: 10px; box-shadow: 0 1px 2px rgba(0,0,0,0.05); margin-bottom: 1.5rem;">
-                    <h3 style="margin-top: 0; color: {primary_color};">Informazioni Periodo</h3>
-                    <p><strong>Periodo:</strong> {date_info['period']}</p>
-                    <p><strong>Dal:</strong> {date_info['start_date']}</p>
-                    <p><strong>Al:</strong> {date_info['end_date']}</p>
-                </div>
-            """, unsafe_allow_html=True)
+            st.markdown(
+                _PERIOD_INFO_TPL % (date_info['period'], date_info['start_date'], date_info['end_date']),
+                unsafe_allow_html=True
+            )
             
             # Generate PDFs section
-            st.markdown(f"""
-                <div style="padding: 1.5rem; background-color: white; border-radius: 10px; box-shadow: 0 1px 2px rgba(0,0,0,0.05);">
-                    <h2 style="margin-top: 0; color: {primary_color};">Generazione PDF</h2>
-                    <p>Cliccando sul pulsante qui sotto verranno generati i PDF per tutti gli operatori presenti nei dati.</p>
-                </div>
-            """, unsafe_allow_html=True)
+            st.markdown(_GENERATE_SECTION_HTML, unsafe_allow_html=True)
             
-            # Generate PDFs button in column for centering
+            # Generate PDFs button in column for centering; the placeholder lets the download
+            # button take its place once the PDFs are ready, without a second columns layout
             col1, col2, col3 = st.columns([1, 2, 1])
             with col2:
-                generate_button = st.button("Genera PDF", use_container_width=True)
+                button_slot = st.empty()
+                generate_button = button_slot.button("Genera PDF", use_container_width=True)
                 
             if generate_button:
-                # Create a temporary directory to store the PDFs
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    # Create a subfolder similar to the VBA macro: "Fogli paghe_<mese>"
-                    pdf_folder = os.path.join(temp_dir, f"Fogli_paghe_{date_info['italian_month']}")
-                    os.makedirs(pdf_folder, exist_ok=True)
-                    
-                    # Group by employee
-                    employees = processed_data['Operatore'].unique()
-                    
-                    # Progress bar with card styling
-                    st.markdown(f"""
-                        <div style="padding: 1.5rem; background-color: white; border-radius: 10px; box-shadow: 0 1px 2px rgba(0,0,0,0.05); margin-top: 1.5rem;">
-                            <h3 style="margin-top: 0; color: {primary_color};">Progresso Generazione</h3>
-                    """, unsafe_allow_html=True)
-                    
-                    progress_bar = st.progress(0)
-                    status_text = st.empty()
+                from pdf_generator import generate_pdf_bytes
+                
+                # Folder name inside the zip, similar to the VBA macro: "Fogli paghe_<mese>"
+                pdf_folder = f"Fogli_paghe_{date_info['italian_month']}"
+                
+                # Group by employee in a single pass over the data (Operatore is categorical)
+                groups = processed_data.groupby('Operatore', sort=False, observed=True)
+                
+                # Progress bar with card styling
+                st.markdown(_PROGRESS_HEADER_HTML, unsafe_allow_html=True)
+                
+                progress_bar = st.progress(0)
+                status_text = st.empty()
+                
+                # File names with naming convention from the macro, computed once per distinct operator
+                file_names = {
+                    employee: str(employee).replace(' ', '_')
+                    for employee in processed_data['Operatore'].cat.categories
+                }
+                
+                # Prepare one task per employee; each task carries the employee's DataFrame slice, which pickles with its dtypes.
+                # Each zip entry is described up front (stored, same timestamp for all), so writing
+                # a PDF is a single pass over its bytes
+                zip_date_time = time.localtime()[:6]
+                employees = []
+                zip_entries = []
+                tasks = []
+                for employee, employee_data in groups:
+                    employees.append(employee)
                     
-                    # Generate PDF for each employee
-                    pdf_files = []
-                    for i, employee in enumerate(employees):
-                        status_text.markdown(f"""
-                            <div style="padding: 0.5rem; border-radius: 5px; margin-bottom: 0.5rem; text-align: center;">
-                                <p style="margin: 0;"><strong>Generazione PDF per</strong>: {employee}...</p>
-                            </div>
-                        """, unsafe_allow_html=True)
-                        
-                        # Filter data for this employee
-                        employee_data = processed_data[processed_data['Operatore'] == employee]
-                        
-                        # Generate PDF with naming convention from the macro
-                        employee_name = str(employee).replace(' ', '_')
-                        pdf_path = os.path.join(pdf_folder, f"Report_{employee_name}.pdf")
-                        generate_pdf(employee_data, pdf_path, date_info)
-                        pdf_files.append(pdf_path)
+                    zip_entry = zipfile.ZipInfo(f"{pdf_folder}/Report_{file_names[employee]}.pdf", date_time=zip_date_time)
+                    zip_entry.compress_type = zipfile.ZIP_STORED
+                    zip_entry.external_attr = 0o600 << 16  # -rw-------, as writestr does for plain names
+                    zip_entries.append(zip_entry)
+                    tasks.append((employee_data, date_info))
+                
+                # Generate the PDFs in parallel, one process per CPU core (but no more processes
+                # than PDFs, and none at all for a single PDF), and write them straight into an
+                # in-memory zip. PDFs are already compressed internally, so they are stored
+                # without a second DEFLATE pass.
+                workers = min(os.cpu_count() or 1, len(tasks))
+                zip_buffer = io.BytesIO()
+                last_update = time.monotonic()
+                with zipfile.ZipFile(zip_buffer, 'w', compression=zipfile.ZIP_STORED) as zip_file, \
+                        (ProcessPoolExecutor(max_workers=workers) if workers > 1 else contextlib.nullcontext()) as executor:
+                    pdf_results = executor.map(generate_pdf_bytes, tasks) if executor else map(generate_pdf_bytes, tasks)
+                    for i, pdf_bytes in enumerate(pdf_results):
+                        zip_file.writestr(zip_entries[i], pdf_bytes)
                         
-                        # Update progress
-                        progress_bar.progress((i + 1) / len(employees))
-                    
-                    status_text.markdown(f"""
-                        <div style="padding: 0.75rem; background-color: #f0fff0; border-left: 4px solid #00aa00; border-radius: 4px; margin: 1rem 0; text-align: center;">
-                            <h3 style="margin: 0; color: #00aa00;">✓ Generazione PDF completata!</h3>
-                        </div>
-                    """, unsafe_allow_html=True)
-                    
-                    st.markdown("</div>", unsafe_allow_html=True)  # Chiude il div di progresso
-                    
-                    # Create zip file containing all PDFs with the folder structure
-                    zip_buffer = io.BytesIO()
-                    with zipfile.ZipFile(zip_buffer, 'w') as zip_file:
-                        for pdf_path in pdf_files:
-                            # Include folder structure in zip
-                            arc_name = os.path.join(os.path.basename(pdf_folder), os.path.basename(pdf_path))
-                            zip_file.write(pdf_path, arc_name)
-                    
-                    # Reset buffer position
-                    zip_buffer.seek(0)
-                    
-                    # Create download button using the naming convention from the macro
-                    st.markdown(f"""
-                        <div style="padding: 1.5rem; background-color: white; border-radius: 10px; box-shadow: 0 1px 2px rgba(0,0,0,0.05); margin-top: 1.5rem; text-align: center;">
-                            <h3 style="margin-top: 0; color: {primary_color};">Download</h3>
-                            <p>Tutti i PDF sono stati generati e compressi in un unico file ZIP.</p>
-                    """, unsafe_allow_html=True)
-                    
-                    col1, col2, col3 = st.columns([1, 2, 1])
-                    with col2:
-                        st.download_button(
-                            label="Scarica tutti i PDF",
-                            data=zip_buffer,
-                            file_name=f"Fogli_paghe_{date_info['italian_month']}.zip",
-                            mime="application/zip",
-                            use_container_width=True
-                        )
-                    
-                    st.markdown("</div>", unsafe_allow_html=True)  # Close the download div
+                        # Update progress at most every 200 ms (each update is a round-trip to the
+                        # browser), always including the last PDF
+                        now = time.monotonic()
+                        if now - last_update >= 0.2 or i + 1 == len(tasks):
+                            status_text.markdown(_STATUS_TPL % employees[i], unsafe_allow_html=True)
+                            progress_bar.progress((i + 1) / len(tasks))
+                            last_update = now
+                
+                status_text.markdown(_COMPLETED_HTML, unsafe_allow_html=True)
+                
+                st.markdown("</div>", unsafe_allow_html=True)  # Chiude il div di progresso
+                
+                # Reset buffer position
+                zip_buffer.seek(0)
+                
+                # Replace the generate button with the download button, using the naming convention from the macro
+                button_slot.download_button(
+                    label="Scarica tutti i PDF",
+                    data=zip_buffer,
+                    file_name=f"{pdf_folder}.zip",
+                    mime="application/zip",
+                    use_container_width=True
+                )
         else:
             st.error("Non è stato possibile elaborare i dati. Verifica che il file sia nel formato corretto.")
     except Exception as e:
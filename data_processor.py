@@ -1,7 +1,54 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-from utils import to_float, format_currency, calculate_period_dates
+from utils import to_float_series, format_currency, calculate_period_dates, days_in_month
+
+# Frammenti (minuscoli) con cui riconoscere le colonne per nome,
+# quando non è possibile usare le posizioni esatte del tracciato
+PATTERN_COLONNE = {
+    'Operatore': ('operatore', 'descrizione oper'),
+    'Codice': ('codice',),
+    'Azienda': ('ragione sociale', 'azienda'),
+    'DIP.': ('dipendenti',),
+    'PARAS.': ('parasub',),
+    'ALTRO': ('altro',),
+    'TOT.': ('totale',),
+    'SOCI': ('soci',),
+}
+
+def testo_pulito(series):
+    """
+    Converte una colonna in testo senza spazi iniziali e finali.
+    
+    Usa il tipo stringa di PyArrow, così le operazioni .str (e i successivi
+    raggruppamenti e confronti) lavorano sui buffer Arrow invece che su oggetti Python.
+    I valori mancanti diventano "nan", come con astype(str).
+    """
+    return series.astype('string[pyarrow]').fillna('nan').str.strip()
+
+def group_by_operatore(processed_data):
+    """
+    Raggruppa le righe elaborate per operatore, nell'ordine in cui gli operatori
+    compaiono, mantenendo l'ordine originale delle righe di ciascun operatore.
+    """
+    gruppo = processed_data.groupby('Operatore', sort=False, observed=True).ngroup().to_numpy()
+    return processed_data.iloc[np.argsort(gruppo, kind='stable')].reset_index(drop=True)
+
+def compact_dtypes(processed_data):
+    """
+    Riduce la memoria occupata dai dati elaborati.
+    
+    I conteggi (DIP., PARAS., ALTRO, TOT., SOCI) diventano interi del tipo più piccolo
+    possibile quando non hanno decimali; Operatore e Codice diventano colonne categoriche,
+    così raggruppamenti e confronti lavorano su codici interi invece che su stringhe.
+    TotaleImporto resta float64 per non perdere precisione sugli importi.
+    """
+    for col in ['DIP.', 'PARAS.', 'ALTRO', 'TOT.', 'SOCI']:
+        if col in processed_data.columns:
+            processed_data[col] = pd.to_numeric(processed_data[col], downcast='integer')
+    for col in ['Operatore', 'Codice']:
+        if col in processed_data.columns:
+            processed_data[col] = processed_data[col].astype('category')
+    return processed_data
 
 def process_data(payroll_data, manual_date_info=None):
     """
@@ -12,21 +59,27 @@ def process_data(payroll_data, manual_date_info=None):
     Applica le regole specifiche per il calcolo delle date di elaborazione.
     
     Parametri:
-        payroll_data (pd.DataFrame): DataFrame contenente i dati grezzi di paga
+        payroll_data (pd.DataFrame o iterabile di pd.DataFrame): DataFrame contenente i dati
+            grezzi di paga, oppure i suoi blocchi (es. pd.read_csv(..., chunksize=...))
         manual_date_info (dict, optional): Dizionario con informazioni sul periodo specificato manualmente
         
     Restituisce:
         tuple: (processed_data, date_info) - dati elaborati e informazioni sul periodo
     """
+    if not isinstance(payroll_data, pd.DataFrame):
+        return process_chunks(payroll_data, manual_date_info)
+    
     try:
         # Clean column names (remove leading/trailing spaces and special characters)
-        payroll_data.columns = payroll_data.columns.str.strip().str.replace('\n', ' ')
+        # senza copiare i dati e senza modificare il DataFrame ricevuto
+        df = payroll_data.rename(columns=lambda c: str(c).strip().replace('\n', ' '), copy=False)
         
         # Print columns for debugging
-        print("Payroll data columns:", payroll_data.columns.tolist())
+        print("Payroll data columns:", df.columns.tolist())
         
-        # Make a copy to avoid modifying the original
-        df = payroll_data.copy()
+        # Usa un indice posizionale, così le colonne calcolate si allineano
+        # anche se l'indice di partenza ha duplicati
+        df.index = pd.RangeIndex(len(df))
         
         # Use manually specified date information if provided
         if manual_date_info:
@@ -62,214 +115,136 @@ def process_data(payroll_data, manual_date_info=None):
         
         # Ottieni gli operatori dalla colonna B (indice 1)
         operatori_col = 1  # Colonna B
-        if operatori_col < len(df.columns):
-            # Rimovi gli spazi in eccesso dai nomi degli operatori
-            df.iloc[:, operatori_col] = df.iloc[:, operatori_col].astype(str).str.strip()
-            operatori = df.iloc[:, operatori_col].dropna().unique()
-        else:
+        if operatori_col >= len(df.columns):
             # Fallback: cerca una colonna chiamata "Operatore" o simile
             operatori_col = next((i for i, col in enumerate(df.columns) if 'operatore' in col.lower()), None)
-            if operatori_col is not None:
-                df.iloc[:, operatori_col] = df.iloc[:, operatori_col].astype(str).str.strip()
-                operatori = df.iloc[:, operatori_col].dropna().unique()
-            else:
+            if operatori_col is None:
                 # Ultimo fallback: usa la prima colonna
-                df.iloc[:, 0] = df.iloc[:, 0].astype(str).str.strip()
-                operatori = df.iloc[:, 0].dropna().unique()
+                operatori_col = 0
+        
+        # Rimuovi gli spazi in eccesso dai nomi degli operatori
+        operatori = testo_pulito(df.iloc[:, operatori_col])
         
         # Initialize new dataframe structure to match the expected output format
         processed_data = pd.DataFrame()
         
-        # Crea un dizionario per mappare il codice azienda alla data di elaborazione
-        # Formato: {codice_azienda: {'giorno': giorno, 'stringa_data': data_formattata}}
-        azienda_to_date_mapping = {}
-        
-        # Estrai la data dalla colonna "Consegna"
-        for idx, row in df.iterrows():
-            try:
-                cod_azienda = str(row['Codice']).strip()
-                if not cod_azienda:
-                    continue
-                    
-                # Ottieni la data dalla colonna "Consegna"
-                data_val = row.get('Consegna', None)
-                
-                # Se la data è vuota, 0 o non valida, usa 01/01/1900
-                if pd.isnull(data_val) or str(data_val).strip() == "" or str(data_val).strip() == "0":
-                    azienda_to_date_mapping[cod_azienda] = {
-                        'giorno': 1,
-                        'data': datetime(1900, 1, 1),
-                        'data_formattata': "01/01/1900"
-                    }
-                    continue
-                
-                if pd.notnull(data_val):
-                    # Prova diverse strategie per estrarre il giorno
-                    giorno = None
-                    
-                    # Strategia 1: è già un numero intero
-                    try:
-                        giorno_val = int(float(str(data_val).strip()))
-                        if 1 <= giorno_val <= 31:
-                            giorno = giorno_val
-                    except:
-                        pass
-                    
-                    # Strategia 2: è una data in formato stringa
-                    if giorno is None:
-                        try:
-                            # Tenta di convertire in data
-                            data_str = str(data_val).strip()
-                            # Verifica se è in formato gg/mm/aaaa o simili
-                            if '/' in data_str:
-                                parts = data_str.split('/')
-                                if len(parts) >= 1 and parts[0].isdigit():
-                                    giorno = int(parts[0])
-                            # Verifica se è in formato gg-mm-aaaa o simili
-                            elif '-' in data_str:
-                                parts = data_str.split('-')
-                                if len(parts) >= 1 and parts[0].isdigit():
-                                    giorno = int(parts[0])
-                        except:
-                            pass
-                    
-                    # Strategia 3: è una data in formato datetime
-                    if giorno is None:
-                        try:
-                            data_datetime = pd.to_datetime(data_val, errors='coerce')
-                            if pd.notnull(data_datetime):
-                                giorno = data_datetime.day
-                        except:
-                            pass
-                            
-                    # Se non siamo riusciti a estrarre un giorno valido, usa un valore di default
-                    if giorno is None:
-                        # Usa il primo giorno del mese come fallback
-                        giorno = 1
-                    
-                    # Calcola mese e anno secondo la regola
-                    # Se giorno > 15, usa il mese selezionato
-                    # Se giorno <= 15, usa il mese successivo
-                    mese_da_usare = selected_month if giorno > 15 else (selected_month % 12) + 1
-                    
-                    # Gestisci il cambio di anno se necessario
-                    anno_da_usare = selected_year
-                    if mese_da_usare < selected_month:
-                        anno_da_usare += 1
-                    
-                    # Assicurati che il giorno sia valido per il mese selezionato
-                    try:
-                        # Calcola l'ultimo giorno del mese
-                        if mese_da_usare in [4, 6, 9, 11]:  # Aprile, Giugno, Settembre, Novembre
-                            ultimo_giorno = 30
-                        elif mese_da_usare == 2:  # Febbraio
-                            # Controllo anno bisestile
-                            if (anno_da_usare % 4 == 0 and anno_da_usare % 100 != 0) or (anno_da_usare % 400 == 0):
-                                ultimo_giorno = 29
-                            else:
-                                ultimo_giorno = 28
-                        else:
-                            ultimo_giorno = 31
-                        
-                        # Usa il giorno corretto (non superiore all'ultimo giorno del mese)
-                        giorno_corretto = min(giorno, ultimo_giorno)
-                        
-                        # Crea la data completa come datetime per elaborazioni interne
-                        data_elaborazione = datetime(anno_da_usare, mese_da_usare, giorno_corretto)
-                        
-                        # Crea anche la stringa della data formattata
-                        data_formattata = f"{giorno_corretto:02d}/{mese_da_usare:02d}/{anno_da_usare}"
-                        
-                        # Aggiungi al mapping sia il giorno originale che la data formattata
-                        azienda_to_date_mapping[cod_azienda] = {
-                            'giorno': giorno, 
-                            'data': data_elaborazione,
-                            'data_formattata': data_formattata
-                        }
-                    except ValueError as e:
-                        # Se la data non è valida, usa una data predefinita
-                        azienda_to_date_mapping[cod_azienda] = {
-                            'giorno': 1,
-                            'data': datetime(selected_year, selected_month, 1),
-                            'data_formattata': f"01/{selected_month:02d}/{selected_year}"
-                        }
-            except Exception as e:
-                continue
+        # Crea una Series per mappare il codice azienda alla data di elaborazione,
+        # calcolata dalla colonna "Consegna" lavorando sull'intera colonna invece che riga per riga
+        # Formato: indice = codice_azienda, valore = data_formattata
+        azienda_to_date_mapping = pd.Series(dtype=object)
         
-        # Per ogni operatore, ottieni i dati delle aziende associate
-        rows = []
-        for operatore in operatori:
-            # Ottieni le righe per questo operatore
-            operatore_rows = df[df.iloc[:, operatori_col] == operatore]
+        if 'Codice' in df.columns:
+            codici = testo_pulito(df['Codice'])
+            if 'Consegna' in df.columns:
+                consegna = df['Consegna']
+            else:
+                consegna = pd.Series(np.nan, index=df.index, dtype=object)
+            consegna_str = testo_pulito(consegna)
+            
+            # Se la data è vuota o 0 usa 01/01/1900
+            vuota = consegna.isna() | consegna_str.isin(["", "0"])
+            
+            # Strategia 1: è già un numero intero (il giorno del mese)
+            giorno = np.trunc(pd.to_numeric(consegna_str, errors='coerce'))
+            giorno = giorno.where(giorno.between(1, 31))
+            
+            # Strategia 2: è una data in formato stringa gg/mm/aaaa o gg-mm-aaaa: vale il primo
+            # campo numerico prima di "/" (o, se manca, prima di "-"), di qualunque lunghezza.
+            # Una data aaaa-mm-gg (anche una cella datetime) dà quindi l'anno, che viene poi
+            # riportato all'ultimo giorno del mese
+            primo_campo = consegna_str.str.extract(r'^(\d+)/', expand=False).where(
+                consegna_str.str.contains('/', regex=False),
+                consegna_str.str.extract(r'^(\d+)-', expand=False),
+            )
+            giorno = giorno.fillna(pd.to_numeric(primo_campo, errors='coerce'))
+            
+            # Strategia 3: è una data in un altro formato riconoscibile, convertita con
+            # un'unica chiamata che accetta formati diversi riga per riga,
+            # leggendo prima il giorno come nelle date italiane (es. gg.mm.aaaa)
+            da_convertire = giorno.isna() & ~vuota
+            if da_convertire.any():
+                date_convertite = pd.to_datetime(consegna[da_convertire], errors='coerce', format='mixed', dayfirst=True)
+                giorno = giorno.fillna(date_convertite.dt.day)
+            
+            # Se non siamo riusciti a estrarre un giorno valido, usa il primo giorno del mese
+            giorno = giorno.fillna(1).astype(int).to_numpy()
+            
+            # Calcola mese e anno secondo la regola
+            # Se giorno > 15, usa il mese selezionato
+            # Se giorno <= 15, usa il mese successivo (con cambio d'anno se necessario)
+            mese = np.where(giorno > 15, selected_month, (selected_month % 12) + 1)
+            anno = np.where(mese < selected_month, selected_year + 1, selected_year)
             
-            # Per ogni riga, estrai i dati corretti
-            for _, row in operatore_rows.iterrows():
-                # Estrai colonne specifiche come specificato dal cliente
-                try:
-                    codice = row.iloc[2] if len(row) > 2 else ""  # Colonna C
-                    azienda = row.iloc[3] if len(row) > 3 else ""  # Colonna D
-                    
-                    # L+M = Dipendenti + Stage/Interinali
-                    dipendenti = 0
-                    if len(row) > 11:  # Colonna L
-                        dipendenti += to_float(row.iloc[11])
-                    if len(row) > 12:  # Colonna M
-                        dipendenti += to_float(row.iloc[12])
-                    
-                    parasub = to_float(row.iloc[13]) if len(row) > 13 else 0  # Colonna N
-                    altro = to_float(row.iloc[15]) if len(row) > 15 else 0    # Colonna P = ALTRO
-                    soci = to_float(row.iloc[14]) if len(row) > 14 else 0     # Colonna O = SOCI
-                    
-                    # Calcola il totale come somma di dipendenti, parasub e altro (escludendo soci)
-                    totale = dipendenti + parasub + altro
-                    
-                    # Ottieni la data corretta per questa azienda dal mapping
-                    cod_azienda_str = str(codice).strip()
-                    data_info_azienda = azienda_to_date_mapping.get(cod_azienda_str, {
-                        'data_formattata': date_info['start_date'],
-                        'data': date_info['min_date']
-                    })
-                    
-                    # Usa la data formattata dal mapping
-                    date_str = data_info_azienda['data_formattata']
-                    
-                    # Calcola TotaleImporto usando il fatturato progressivo se disponibile
-                    fatturato = to_float(row.iloc[35]) if len(row) > 35 else 0  # Fatturato progressivo
-                    totale_importo = fatturato if fatturato > 0 else totale * 100
-                    
-                    # Raccogli i dati in un dizionario
-                    rows.append({
-                        'Operatore': operatore,
-                        'Codice': codice,
-                        'Azienda': azienda,
-                        'DIP.': dipendenti,
-                        'PARAS.': parasub,
-                        'ALTRO': altro,
-                        'TOT.': totale,
-                        'SOCI': soci,
-                        'NOTE': "",  # Placeholder per eventuali note
-                        'Data': date_str,  # Data calcolata in base alle regole aziendali
-                        'TotaleImporto': totale_importo  # Campo richiesto per la generazione PDF
-                    })
-                except Exception as row_e:
-                    print(f"Errore nel processing della riga per l'operatore {operatore}: {str(row_e)}")
-                    continue
+            # Usa il giorno corretto (non superiore all'ultimo giorno del mese)
+            ultimo_giorno = days_in_month(anno, mese)
+            giorno = np.minimum(giorno, ultimo_giorno)
+            
+            # Se il giorno non è valido (es. "0/03/2025") usa il primo giorno del mese selezionato
+            non_valido = giorno < 1
+            giorno = np.where(non_valido, 1, giorno)
+            mese = np.where(non_valido, selected_month, mese)
+            anno = np.where(non_valido, selected_year, anno)
+            
+            # Crea la data (datetime64, senza oggetti Python per riga) e la sua stringa gg/mm/aaaa
+            data_elaborazione = pd.to_datetime(pd.DataFrame({'year': anno, 'month': mese, 'day': giorno}, index=df.index))
+            data_formattata = data_elaborazione.dt.strftime('%d/%m/%Y').where(~vuota, "01/01/1900")
+            
+            # Ignora le righe senza codice; se un codice compare più volte vale l'ultima riga
+            con_codice = codici != ""
+            azienda_to_date_mapping = pd.Series(data_formattata[con_codice].to_numpy(), index=codici[con_codice])
+            azienda_to_date_mapping = azienda_to_date_mapping[~azienda_to_date_mapping.index.duplicated(keep='last')]
         
-        # Crea il dataframe dai dati raccolti
-        if rows:
-            processed_data = pd.DataFrame(rows)
+        # Estrai le colonne specifiche come specificato dal cliente, convertendo
+        # ogni colonna numerica una sola volta invece di cella per cella
+        if len(df):
+            n_col = len(df.columns)
+            testo_vuoto = pd.Series("", index=df.index)
+            zero = pd.Series(0.0, index=df.index)
+            
+            def colonna_numerica(i):
+                return to_float_series(df.iloc[:, i]) if n_col > i else zero
+            
+            codice = df.iloc[:, 2] if n_col > 2 else testo_vuoto   # Colonna C
+            azienda = df.iloc[:, 3] if n_col > 3 else testo_vuoto  # Colonna D
+            
+            # L+M = Dipendenti + Stage/Interinali
+            dipendenti = colonna_numerica(11) + colonna_numerica(12)
+            parasub = colonna_numerica(13)  # Colonna N
+            altro = colonna_numerica(15)    # Colonna P = ALTRO
+            soci = colonna_numerica(14)     # Colonna O = SOCI
+            
+            # Calcola il totale come somma di dipendenti, parasub e altro (escludendo soci)
+            totale = dipendenti + parasub + altro
+            
+            # Ottieni la data corretta per ogni azienda dal mapping
+            date_str = testo_pulito(codice).map(azienda_to_date_mapping).fillna(date_info['start_date'])
+            
+            # Calcola TotaleImporto usando il fatturato progressivo se disponibile
+            fatturato = colonna_numerica(35)  # Fatturato progressivo
+            totale_importo = np.where(fatturato > 0, fatturato, totale * 100)
+            
+            processed_data = pd.DataFrame({
+                'Operatore': operatori,
+                'Codice': codice,
+                'Azienda': azienda,
+                'DIP.': dipendenti,
+                'PARAS.': parasub,
+                'ALTRO': altro,
+                'TOT.': totale,
+                'SOCI': soci,
+                'NOTE': "",  # Placeholder per eventuali note
+                'Data': date_str,  # Data calcolata in base alle regole aziendali
+                'TotaleImporto': totale_importo  # Campo richiesto per la generazione PDF
+            }, index=df.index)
+            
+            processed_data = group_by_operatore(processed_data)
         else:
             # Se non siamo riusciti a estrarre dati dalle colonne esatte, proviamo un'alternativa
             # Mappatura delle colonne per nome
+            colonne_minuscole = [(col.lower(), col) for col in df.columns]
             col_map = {
-                'Operatore': next((col for col in df.columns if 'operatore' in col.lower() or 'descrizione oper' in col.lower()), None),
-                'Codice': next((col for col in df.columns if 'codice' in col.lower()), None),
-                'Azienda': next((col for col in df.columns if 'ragione sociale' in col.lower() or 'azienda' in col.lower()), None),
-                'DIP.': next((col for col in df.columns if 'dipendenti' in col.lower()), None),
-                'PARAS.': next((col for col in df.columns if 'parasub' in col.lower()), None),
-                'ALTRO': next((col for col in df.columns if 'altro' in col.lower()), None),
-                'TOT.': next((col for col in df.columns if 'totale' in col.lower()), None),
-                'SOCI': next((col for col in df.columns if 'soci' in col.lower()), None)
+                output_col: next((col for nome, col in colonne_minuscole if any(p in nome for p in patterns)), None)
+                for output_col, patterns in PATTERN_COLONNE.items()
             }
             
             # Usa le colonne trovate per creare il dataframe
@@ -292,19 +267,49 @@ def process_data(payroll_data, manual_date_info=None):
             processed_data['Data'] = date_info['start_date']
             
             # Ottieni la colonna "Fatturato progressivo" se disponibile
-            fatturato_col = next((col for col in df.columns if 'fatturato progressivo' in col.lower()), None)
+            fatturato_col = next((col for nome, col in colonne_minuscole if 'fatturato progressivo' in nome), None)
             if fatturato_col and fatturato_col in df.columns:
-                processed_data['TotaleImporto'] = df[fatturato_col].apply(to_float)
+                processed_data['TotaleImporto'] = to_float_series(df[fatturato_col])
             else:
                 processed_data['TotaleImporto'] = processed_data['TOT.'] * 100  # Calcolo di riserva
         
         # Assicurati che tutte le colonne numeriche siano effettivamente numeri
         for col in ['DIP.', 'PARAS.', 'ALTRO', 'TOT.', 'SOCI']:
             if col in processed_data.columns:
-                processed_data[col] = processed_data[col].apply(to_float)
+                processed_data[col] = to_float_series(processed_data[col])
         
-        return processed_data, date_info
+        return compact_dtypes(processed_data), date_info
         
     except Exception as e:
         print(f"Errore durante il processing dei dati: {str(e)}")
         return pd.DataFrame(), {}
+
+def process_chunks(chunks, manual_date_info=None):
+    """
+    Elabora i dati di paga un blocco alla volta e unisce i risultati.
+    
+    Il periodo viene calcolato sul primo blocco (se non specificato manualmente)
+    e riusato per tutti i successivi, così le date di elaborazione sono coerenti.
+    
+    Parametri:
+        chunks (iterabile di pd.DataFrame): Blocchi dei dati grezzi di paga
+        manual_date_info (dict, optional): Dizionario con informazioni sul periodo specificato manualmente
+        
+    Restituisce:
+        tuple: (processed_data, date_info) - dati elaborati e informazioni sul periodo
+    """
+    date_info = manual_date_info
+    parts = []
+    for chunk in chunks:
+        processed_chunk, chunk_date_info = process_data(chunk, date_info)
+        if not date_info:
+            date_info = chunk_date_info
+        if not processed_chunk.empty:
+            parts.append(processed_chunk)
+    
+    if not parts:
+        return pd.DataFrame(), date_info or {}
+    
+    # Riunisci le righe di ogni operatore sparse nei diversi blocchi
+    # (le colonne categoriche con categorie diverse tornano di tipo object nel concat)
+    return compact_dtypes(group_by_operatore(pd.concat(parts, ignore_index=True))), date_info
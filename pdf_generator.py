@@ -8,8 +8,104 @@ from utils import format_currency
 import locale
 from datetime import datetime
 import re
+import io
 
-def generate_pdf(employee_data, output_path, date_info):
+# Colonne dei dati mostrate in ogni tabella (nell'ordine delle intestazioni) e valori predefiniti
+TABLE_DEFAULTS = {'Codice': '', 'Azienda': '', 'DIP.': 0, 'PARAS.': 0, 'ALTRO': 0, 'SOCI': 0, 'NOTE': ''}
+TABLE_COLUMNS = ['Codice', 'Azienda', 'DIP.', 'PARAS.', 'ALTRO', 'TOT.', 'SOCI', 'NOTE']
+
+# Espressione regolare per le date gg/mm/aaaa (anche con separatori "." o "-")
+_DATE_RE = re.compile(r'(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})')
+
+# Definizione dei colori in stile moderno
+APPLE_BLUE = colors.HexColor('#007AFF')  # Blu principale
+APPLE_LIGHT_GRAY = colors.HexColor('#F5F5F7')  # Grigio chiaro per righe alternate
+APPLE_DARK_GRAY = colors.HexColor('#333333')  # Grigio scuro per testo
+
+# Definizione degli stili del documento in stile moderno
+_styles = getSampleStyleSheet()
+TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=_styles["Heading1"],
+    alignment=1,  # Allineamento centrale
+    fontSize=18,
+    fontName='Helvetica-Bold',
+    textColor=APPLE_DARK_GRAY,
+    spaceAfter=16,
+    leading=22
+)
+SUBTITLE_STYLE = ParagraphStyle(
+    'CustomSubtitle',
+    parent=_styles["Heading2"],
+    fontSize=14,
+    fontName='Helvetica-Bold',
+    textColor=APPLE_BLUE,
+    spaceBefore=12,
+    spaceAfter=8,
+    leading=18
+)
+NORMAL_STYLE = ParagraphStyle(
+    'CustomNormal',
+    parent=_styles["Normal"],
+    fontSize=10,
+    fontName='Helvetica',
+    textColor=APPLE_DARK_GRAY,
+    leading=14
+)
+
+# Stile tabella moderno, condiviso da tutte le tabelle di tutti i PDF
+TABLE_STYLE = TableStyle([
+    # Header
+    ('BACKGROUND', (0, 0), (-1, 0), APPLE_BLUE),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('TOPPADDING', (0, 0), (-1, 0), 12),
+
+    # Dati
+    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+    ('TEXTCOLOR', (0, 1), (-1, -1), APPLE_DARK_GRAY),
+    ('ALIGN', (0, 1), (0, -1), 'CENTER'),  # Codice centrato
+    ('ALIGN', (1, 1), (1, -1), 'LEFT'),    # Datore di lavoro a sinistra
+    ('ALIGN', (2, 1), (6, -1), 'CENTER'),  # Valori numerici centrati
+    ('ALIGN', (7, 1), (7, -1), 'LEFT'),    # Note a sinistra
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+
+    # Colore TOT.
+    ('TEXTCOLOR', (5, 1), (5, -1), APPLE_BLUE),
+    ('FONTNAME', (5, 1), (5, -1), 'Helvetica-Bold'),
+
+    # Bordi
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
+    ('LINEABOVE', (0, 0), (-1, 0), 1, APPLE_BLUE),
+    ('LINEBELOW', (0, 0), (-1, 0), 1, APPLE_BLUE),
+
+    # Righe alternate
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, APPLE_LIGHT_GRAY])
+])
+
+def convert_date_string(date_str):
+    """
+    Restituisce la chiave di ordinamento cronologico di una data gg/mm/aaaa.
+    
+    Le date riconosciute diventano un intero AAAAMMGG (confronto tra interi
+    invece che tra stringhe); i valori non riconosciuti vengono messi in coda,
+    ordinati come testo.
+    """
+    try:
+        # Estrai giorno, mese e anno con regex
+        match = _DATE_RE.match(date_str)
+        if match:
+            day, month, year = map(int, match.groups())
+            return (0, year * 10000 + month * 100 + day, "")  # AAAAMMGG per ordinamento
+        return (1, 0, date_str)
+    except:
+        return (1, 0, str(date_str))
+
+def generate_pdf(employee_data, output, date_info):
     """
     Genera un PDF di riepilogo paghe per un operatore.
     
@@ -19,7 +115,8 @@ def generate_pdf(employee_data, output_path, date_info):
     
     Parametri:
         employee_data (pd.DataFrame): DataFrame contenente i dati dell'operatore
-        output_path (str): Percorso dove salvare il file PDF
+        output (str o file-like): Percorso dove salvare il file PDF, oppure un oggetto
+            file-like (es. io.BytesIO) in cui scriverlo
         date_info (dict): Dizionario con informazioni sul periodo di riferimento per l'intestazione
     """
     if employee_data.empty:
@@ -29,9 +126,26 @@ def generate_pdf(employee_data, output_path, date_info):
     employee_name = str(employee_data['Operatore'].iloc[0])
     total_amount = employee_data['TotaleImporto'].iloc[0]
     
+    # Aggiungi le colonne della tabella eventualmente mancanti, con il loro valore predefinito
+    employee_data = employee_data.assign(**{
+        col: default for col, default in TABLE_DEFAULTS.items() if col not in employee_data.columns
+    })
+    
+    # Calcola la colonna TOT. (DIP. + PARAS. + ALTRO) per tutte le righe con un'unica somma vettoriale
+    employee_data = employee_data.assign(**{
+        'TOT.': employee_data[['DIP.', 'PARAS.', 'ALTRO']].to_numpy(dtype=float).sum(axis=1)
+    })
+    
+    # Converti una sola volta in testo intero le colonne numeriche mostrate in tabella
+    numeric_columns = ['DIP.', 'PARAS.', 'ALTRO', 'TOT.', 'SOCI']
+    employee_data[numeric_columns] = employee_data[numeric_columns].astype(float).astype('int64').astype(str)
+    
+    # Tronca i nomi delle aziende troppo lunghi a 40 caratteri, una volta per tutte le righe
+    employee_data['Azienda'] = employee_data['Azienda'].astype(str).str.slice(0, 40)
+    
     # Crea il documento PDF con le dimensioni e i margini appropriati
     doc = SimpleDocTemplate(
-        output_path,
+        output,
         pagesize=A4,
         rightMargin=1.5*cm,
         leftMargin=1.5*cm,
@@ -42,64 +156,20 @@ def generate_pdf(employee_data, output_path, date_info):
     # Contenitore per tutti gli elementi del PDF
     elements = []
     
-    # Conta il numero totale di date (una tabella per data)
-    total_pages = len(pd.unique(employee_data['Data']))
-    
-    # Definizione dei colori in stile moderno
-    apple_blue = colors.HexColor('#007AFF')  # Blu principale
-    # Funzione per convertire stringhe di data
-    def convert_date_string(date_str):
-        try:
-            # Estrai giorno, mese e anno con regex
-            match = re.match(r'(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})', date_str)
-            if match:
-                day, month, year = map(int, match.groups())
-                return f"{year:04d}{month:02d}{day:02d}"  # Formato YYYYMMDD per ordinamento
-            return date_str
-        except:
-            return date_str
-
-    apple_light_gray = colors.HexColor('#F5F5F7')  # Grigio chiaro per righe alternate
-    apple_dark_gray = colors.HexColor('#333333')  # Grigio scuro per testo
+    # Ordina le date uniche cronologicamente, poi ordina una sola volta le righe per data
+    # (ordinamento stabile su un intero): i gruppi per data risultano già in ordine cronologico
+    unique_dates = sorted(employee_data['Data'].unique(), key=convert_date_string)
+    date_order = {date: position for position, date in enumerate(unique_dates)}
+    employee_data = employee_data.iloc[employee_data['Data'].map(date_order).argsort(kind='stable')]
+    date_groups = employee_data.groupby('Data', sort=False, dropna=False)
     
-    # Definizione degli stili del documento in stile moderno
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles["Heading1"],
-        alignment=1,  # Allineamento centrale
-        fontSize=18,
-        fontName='Helvetica-Bold',
-        textColor=apple_dark_gray,
-        spaceAfter=16,
-        leading=22
-    )
-    subtitle_style = ParagraphStyle(
-        'CustomSubtitle',
-        parent=styles["Heading2"],
-        fontSize=14,
-        fontName='Helvetica-Bold',
-        textColor=apple_blue,
-        spaceBefore=12,
-        spaceAfter=8,
-        leading=18
-    )
-    normal_style = ParagraphStyle(
-        'CustomNormal',
-        parent=styles["Normal"],
-        fontSize=10,
-        fontName='Helvetica',
-        textColor=apple_dark_gray,
-        leading=14
-    )
+    # Conta il numero totale di date (una tabella per data)
+    total_pages = date_groups.ngroups
     
     # Intestazione della prima pagina con titolo
-    elements.append(Paragraph(f"Elenco mese di {date_info['period']} - {employee_name}", title_style))
+    elements.append(Paragraph(f"Elenco mese di {date_info['period']} - {employee_name}", TITLE_STYLE))
     elements.append(Spacer(1, 0.3*cm))  # Spazio ridotto dopo il titolo
     
-    # Ottieni le date uniche dai dati e ordinale cronologicamente 
-    unique_dates = sorted(employee_data['Data'].unique(), key=convert_date_string)
-    
     # Stima di quanto spazio rimane nella pagina corrente
     available_space = 0  # Inizialmente 0, sarà aggiornato dopo ogni tabella
     
@@ -115,12 +185,11 @@ def generate_pdf(employee_data, output_path, date_info):
         return page_counter[0]
     
     # Per ogni data, crea una sezione separata
-    for i, date in enumerate(unique_dates):
+    for i, (date, date_data) in enumerate(date_groups):
         # Formato data più leggibile
         date_str = date if isinstance(date, str) else str(date)
         
         # Calcola lo spazio necessario per questa tabella
-        date_data = employee_data[employee_data['Data'] == date]
         rows_count = len(date_data) + 1  # +1 per l'header
         estimated_table_height = (rows_count * 12) * mm  # Stima rozza: 12mm per riga
         
@@ -149,7 +218,7 @@ def generate_pdf(employee_data, output_path, date_info):
                 elements.append(Spacer(1, space_between_tables))
         
         # Intestazione della data con stile Apple
-        elements.append(Paragraph(f"Per il {date_str}", subtitle_style))
+        elements.append(Paragraph(f"Per il {date_str}", SUBTITLE_STYLE))
         elements.append(Spacer(1, 0.3*cm))
         
         # Crea la tabella per questa data
@@ -160,57 +229,23 @@ def generate_pdf(employee_data, output_path, date_info):
         table_data.append(headers)
         
         # Aggiungi righe
-        for _, row in date_data.iterrows():
+        for codice, azienda, dip, paras, altro, tot, soci, note in date_data[TABLE_COLUMNS].itertuples(index=False, name=None):
             table_row = [
-                str(row.get('Codice', '')),
-                str(row.get('Azienda', ''))[:40],  # Tronca i nomi troppo lunghi a 40 caratteri
-                str(int(row.get('DIP.', 0))),      # Converti a intero
-                str(int(row.get('PARAS.', 0))),    # Converti a intero
-                str(int(row.get('ALTRO', 0))),     # Converti a intero
-                str(int(row.get('DIP.', 0) + row.get('PARAS.', 0) + row.get('ALTRO', 0))),  # Calcola TOT
-                str(int(row.get('SOCI', 0))),      # Converti a intero
-                str(row.get('NOTE', ''))
+                str(codice),
+                azienda,            # Già troncato a 40 caratteri
+                dip,                # Valori già convertiti a intero
+                paras,
+                altro,
+                tot,                # Totale precalcolato
+                soci,
+                str(note)
             ]
             table_data.append(table_row)
         
         # Crea tabella con larghezze personalizzate
         table = Table(table_data, colWidths=[2*cm, 8*cm, 1.5*cm, 1.5*cm, 1.5*cm, 1.5*cm, 1.5*cm, 2*cm])
         
-        # Stile tabella moderno
-        table_style = TableStyle([
-            # Header
-            ('BACKGROUND', (0, 0), (-1, 0), apple_blue),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('TOPPADDING', (0, 0), (-1, 0), 12),
-            
-            # Dati
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('TEXTCOLOR', (0, 1), (-1, -1), apple_dark_gray),
-            ('ALIGN', (0, 1), (0, -1), 'CENTER'),  # Codice centrato
-            ('ALIGN', (1, 1), (1, -1), 'LEFT'),    # Datore di lavoro a sinistra
-            ('ALIGN', (2, 1), (6, -1), 'CENTER'),  # Valori numerici centrati
-            ('ALIGN', (7, 1), (7, -1), 'LEFT'),    # Note a sinistra
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            
-            # Colore TOT.
-            ('TEXTCOLOR', (5, 1), (5, -1), apple_blue),
-            ('FONTNAME', (5, 1), (5, -1), 'Helvetica-Bold'),
-            
-            # Bordi
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
-            ('LINEABOVE', (0, 0), (-1, 0), 1, apple_blue),
-            ('LINEBELOW', (0, 0), (-1, 0), 1, apple_blue),
-            
-            # Righe alternate
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, apple_light_gray])
-        ])
-        
-        table.setStyle(table_style)
+        table.setStyle(TABLE_STYLE)
         elements.append(table)
         elements.append(Spacer(1, 1*cm))
         
@@ -236,7 +271,7 @@ def generate_pdf(employee_data, output_path, date_info):
         
         # Configura l'intestazione
         canvas.setFont('Helvetica-Bold', 8)
-        canvas.setFillColor(apple_blue)
+        canvas.setFillColor(APPLE_BLUE)
         
         # Nome studio a destra dell'intestazione
         canvas.drawRightString(doc.width + doc.rightMargin, doc.height + doc.topMargin, "Studio Associato Bontempo")
@@ -245,13 +280,13 @@ def generate_pdf(employee_data, output_path, date_info):
         canvas.drawString(doc.leftMargin, doc.height + doc.topMargin, employee_name)
         
         # Linea separatrice sotto l'intestazione
-        canvas.setStrokeColor(apple_light_gray)
+        canvas.setStrokeColor(APPLE_LIGHT_GRAY)
         canvas.line(doc.leftMargin, doc.height + doc.topMargin - 5, 
                    doc.width + doc.rightMargin, doc.height + doc.topMargin - 5)
         
         # Configura il piè di pagina
         canvas.setFont('Helvetica', 8)
-        canvas.setFillColor(apple_dark_gray)
+        canvas.setFillColor(APPLE_DARK_GRAY)
         
         # Informazioni periodo e studio nel piè di pagina
         footer_text = f"{date_info['period']} - Studio Associato Bontempo"
@@ -276,3 +311,22 @@ def generate_pdf(employee_data, output_path, date_info):
     doc.build(elements, onFirstPage=add_page_number, onLaterPages=add_page_number)
     
     return True
+
+def generate_pdf_bytes(task):
+    """
+    Genera in memoria il PDF di un operatore e ne restituisce il contenuto.
+    
+    Pensata per essere eseguita in un processo separato (ProcessPoolExecutor):
+    il DataFrame dell'operatore viene trasferito così com'è, mantenendo i tipi
+    delle colonne (ad esempio un Codice intero non diventa "103.0").
+    
+    Parametri:
+        task (tuple): (employee_data, date_info)
+        
+    Restituisce:
+        bytes: Contenuto del file PDF generato
+    """
+    employee_data, date_info = task
+    buffer = io.BytesIO()
+    generate_pdf(employee_data, buffer, date_info)
+    return buffer.getvalue()
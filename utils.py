@@ -1,8 +1,14 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-import locale
-import calendar
+import functools
+
+# Tabella per scambiare i separatori di migliaia e decimali (1,234.56 -> 1.234,56)
+_SEP_TABLE = str.maketrans({",": ".", ".": ","})
+
+# Tabella per ripulire i numeri in formato europeo: rimuove i simboli di valuta
+# e i separatori delle migliaia, e usa il punto come separatore decimale
+_CLEAN = str.maketrans({"€": "", "$": "", ".": "", ",": "."})
 
 def format_currency(value):
     """
@@ -19,25 +25,38 @@ def format_currency(value):
         str: Stringa formattata come valuta
     """
     try:
-        # Try to set Italian locale for proper formatting
-        try:
-            locale.setlocale(locale.LC_ALL, 'it_IT.UTF-8')
-        except:
-            try:
-                locale.setlocale(locale.LC_ALL, 'it_IT')
-            except:
-                # Fallback if Italian locale is not available
-                pass
-        
         # Convert to float first
         val = to_float(value)
         
-        # Format with Euro symbol
-        return f"€ {val:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+        # Format with Euro symbol, swapping separators in a single pass
+        return f"€ {val:,.2f}".translate(_SEP_TABLE)
     except:
         # Return original value if formatting fails
         return str(value)
 
+def format_currency_series(series):
+    """
+    Formatta un'intera colonna come valuta (€ X.XXX,XX), con le stesse regole
+    di format_currency ma senza chiamare una funzione Python per ogni valore.
+    
+    Parametri:
+        series (pd.Series): La colonna da formattare
+        
+    Restituisce:
+        pd.Series: Colonna di stringhe formattate come valuta
+    """
+    if series.empty:
+        return pd.Series([], index=series.index, dtype=object)
+    
+    valori = to_float_series(series).to_numpy()
+    testo = pd.Series(np.char.mod('%.2f', valori), index=series.index)
+    
+    # Separa parte intera e decimale, poi aggiungi il punto come separatore delle migliaia
+    parti = testo.str.partition('.')
+    intero = parti[0].str.replace(r'(\d)(?=(\d{3})+$)', r'\1.', regex=True)
+    
+    return "€ " + intero + parti[1].str.replace('.', ',', regex=False) + parti[2]
+
 def to_float(value):
     """
     Converte un valore in float, gestendo diversi formati di numeri.
@@ -52,6 +71,20 @@ def to_float(value):
     Restituisce:
         float: Valore convertito o 0.0 se la conversione fallisce
     """
+    # Fast path for plain numbers (the most common case), without going through pd.isna
+    if type(value) is float:
+        return value if value == value else 0.0
+    if type(value) is int:
+        return float(value)
+    
+    # European number format (comma as decimal separator, no dot after the last comma):
+    # float() would certainly fail, so clean the string straight away
+    if isinstance(value, str) and value.rfind(".") < value.rfind(","):
+        try:
+            return float(value.translate(_CLEAN))
+        except ValueError:
+            return 0.0
+    
     if pd.isna(value):
         return 0.0
     
@@ -60,18 +93,123 @@ def to_float(value):
         return float(value)
     except (ValueError, TypeError):
         if isinstance(value, str):
-            # Handle European number format (comma as decimal separator)
+            # Handle European number format (comma as decimal separator) and currency symbols,
+            # in a single pass over the string
             try:
-                return float(value.replace(".", "").replace(",", "."))
+                return float(value.translate(_CLEAN))
             except (ValueError, TypeError):
-                # Remove currency symbols and try again
-                clean_value = value.replace("€", "").replace("$", "").strip()
-                try:
-                    return float(clean_value.replace(".", "").replace(",", "."))
-                except (ValueError, TypeError):
-                    return 0.0
+                return 0.0
         return 0.0
 
+def to_float_series(series):
+    """
+    Converte un'intera colonna in float, con le stesse regole di to_float.
+    
+    I valori già numerici (o stringhe in formato inglese) vengono convertiti
+    in un solo passaggio con pd.to_numeric; le stringhe rimanenti (es. "1.234,56"
+    o "€ 10") vengono ripulite con str.translate e convertite anch'esse per colonna.
+    Solo i valori che non sono ancora numeri passano per to_float, uno alla volta.
+    
+    Parametri:
+        series (pd.Series): La colonna da convertire
+        
+    Restituisce:
+        pd.Series: Colonna di float, con 0.0 al posto dei valori mancanti o non validi
+    """
+    # Colonna già numerica: basta un cast, senza cercare valori da convertire uno alla volta
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float).fillna(0.0)
+    
+    result = pd.to_numeric(series, errors='coerce').astype(float)
+    mancanti = series.isna()
+    residui = result.isna() & ~mancanti
+    if residui.any():
+        testo = series[residui].astype(str)
+        
+        # Formato europeo (virgola come separatore decimale) e simboli di valuta,
+        # ripuliti con un solo passaggio su tutte le stringhe
+        convertiti = pd.to_numeric(testo.str.translate(_CLEAN).str.strip(), errors='coerce')
+        
+        # Casi particolari (testo non numerico, "nan", tipi non stringa): come to_float
+        ancora = convertiti.isna()
+        if ancora.any():
+            convertiti[ancora] = series[residui][ancora].map(to_float)
+        
+        result[residui] = convertiti
+    result[mancanti] = 0.0
+    return result
+
+# Nomi dei mesi in italiano, minuscoli, indicizzati dal numero del mese (1-12)
+_ITALIAN_MONTHS = ('', 'gennaio', 'febbraio', 'marzo', 'aprile', 'maggio', 'giugno',
+                   'luglio', 'agosto', 'settembre', 'ottobre', 'novembre', 'dicembre')
+_ITALIAN_MONTHS_TITLE = tuple(month.capitalize() for month in _ITALIAN_MONTHS)
+
+# Giorni di ciascun mese in un anno non bisestile, indicizzati dal numero del mese (1-12)
+DAYS_IN_MONTH = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+def days_in_month(year, month):
+    """
+    Restituisce il numero di giorni del mese indicato, tenendo conto degli anni bisestili.
+    
+    Accetta sia singoli numeri sia array NumPy di anni e mesi (calcolo elemento per elemento).
+    """
+    leap = ((year % 4 == 0) & (year % 100 != 0)) | (year % 400 == 0)
+    return DAYS_IN_MONTH[month] + ((month == 2) & leap)
+
+@functools.lru_cache(maxsize=256)
+def _period_label(start_month, start_year, end_month, end_year):
+    """
+    Restituisce la descrizione del periodo (es. "Aprile 2025", oppure
+    "Marzo 2025 - Aprile 2025" se il periodo comprende più mesi).
+    """
+    label = f"{_ITALIAN_MONTHS_TITLE[start_month]} {start_year}"
+    
+    # If the period spans multiple months, use the range
+    if (start_month, start_year) != (end_month, end_year):
+        label = f"{label} - {_ITALIAN_MONTHS_TITLE[end_month]} {end_year}"
+    return label
+
+def _parse_dates(values):
+    """
+    Converte una colonna in date, provando prima i formati espliciti più comuni
+    (gg/mm/aaaa, poi ISO 8601) e solo per i valori rimasti il riconoscimento
+    del formato elemento per elemento, molto più lento.
+    """
+    dates = pd.to_datetime(values, format='%d/%m/%Y', errors='coerce')
+    for options in ({'format': 'ISO8601'}, {'format': 'mixed', 'dayfirst': True}):
+        remaining = dates.isna() & values.notna()
+        if not remaining.any():
+            break
+        dates[remaining] = pd.to_datetime(values[remaining], errors='coerce', **options)
+    return dates
+
+def _column_dates(columns):
+    """
+    Converte in date i valori di più colonne, restituiti in un'unica Series.
+    
+    Le colonne che sono già date non vengono riconvertite; le altre vengono
+    concatenate e convertite insieme con _parse_dates.
+    """
+    parsed = []
+    to_parse = []
+    for col in columns:
+        if pd.api.types.is_datetime64_any_dtype(col):
+            parsed.append(col)
+        elif isinstance(col.dtype, np.dtype) and col.dtype.kind in 'iu':
+            # Colonna di interi (istanti in nanosecondi, come li interpreta pd.to_datetime):
+            # basta convertire il minimo e il massimo, senza creare una data per ogni riga
+            if len(col):
+                values = col.to_numpy()
+                parsed.append(pd.Series(np.array([values.min(), values.max()], dtype='int64').astype('datetime64[ns]')))
+        else:
+            to_parse.append(col)
+
+    if to_parse:
+        parsed.append(_parse_dates(pd.concat(to_parse, ignore_index=True)))
+    if not parsed:
+        return pd.Series([], dtype='datetime64[ns]')
+    return pd.concat(parsed, ignore_index=True) if len(parsed) > 1 else parsed[0]
+
 def calculate_period_dates(df, date_columns):
     """
     Calcola le date di inizio e fine periodo basandosi sui dati.
@@ -92,53 +230,46 @@ def calculate_period_dates(df, date_columns):
                 'end_date': Data di fine in formato "gg/mm/aaaa",
                 'min_date': Oggetto datetime con la data minima,
                 'max_date': Oggetto datetime con la data massima,
+                'min_date64': Data minima come np.datetime64 (giorno),
+                'max_date64': Data massima come np.datetime64 (giorno),
                 'italian_month': Nome del mese in italiano, minuscolo
             }
     """
     min_date = None
     max_date = None
     
-    # Try to find date columns and extract min/max dates
-    for col in date_columns:
-        if col in df.columns:
-            series = pd.to_datetime(df[col], errors='coerce')
-            if not series.isna().all():
-                col_min = series.min()
-                col_max = series.max()
-                
-                if min_date is None or col_min < min_date:
-                    min_date = col_min
-                
-                if max_date is None or col_max > max_date:
-                    max_date = col_max
+    # Try to find date columns and extract min/max dates, parsing the candidate
+    # columns together and reducing them with a single min/max. If the first column
+    # already falls within a single month, it is taken as the reference date column
+    # and the others are not parsed at all.
+    columns = [df[col] for col in date_columns if col in df.columns]
+    if columns:
+        series = _column_dates(columns[:1])
+        if series.notna().any():
+            min_date = series.min()
+            max_date = series.max()
+        same_month = min_date is not None and (min_date.year, min_date.month) == (max_date.year, max_date.month)
+        if not same_month and len(columns) > 1:
+            series = pd.concat([series, _column_dates(columns[1:])], ignore_index=True)
+            if series.notna().any():
+                min_date = series.min()
+                max_date = series.max()
     
     # If no valid dates found, use current month
     if min_date is None:
         now = datetime.now()
         min_date = datetime(now.year, now.month, 1)
-        max_date = datetime(now.year, now.month, calendar.monthrange(now.year, now.month)[1])
+        max_date = datetime(now.year, now.month, int(days_in_month(now.year, now.month)))
     
-    # Format dates
-    month_name = min_date.strftime("%B").capitalize()
-    year = min_date.year
-    
-    # If the period spans multiple months, use the range
-    if min_date.month != max_date.month or min_date.year != max_date.year:
-        period = f"{min_date.strftime('%B %Y')} - {max_date.strftime('%B %Y')}"
-    else:
-        period = f"{month_name} {year}"
+    # Format dates (Italian month names, independent of the process locale)
+    period = _period_label(min_date.month, min_date.year, max_date.month, max_date.year)
     
     # Format dates for display
     start_date = min_date.strftime("%d/%m/%Y")
     end_date = max_date.strftime("%d/%m/%Y")
     
     # Get Italian month name for folder naming
-    italian_months = {
-        1: "gennaio", 2: "febbraio", 3: "marzo", 4: "aprile",
-        5: "maggio", 6: "giugno", 7: "luglio", 8: "agosto",
-        9: "settembre", 10: "ottobre", 11: "novembre", 12: "dicembre"
-    }
-    italian_month = italian_months.get(min_date.month, month_name.lower())
+    italian_month = _ITALIAN_MONTHS[min_date.month]
     
     return {
         "period": period,
@@ -146,5 +277,7 @@ def calculate_period_dates(df, date_columns):
         "end_date": end_date,
         "min_date": min_date,
         "max_date": max_date,
+        "min_date64": np.datetime64(min_date.date(), 'D'),
+        "max_date64": np.datetime64(max_date.date(), 'D'),
         "italian_month": italian_month
     }